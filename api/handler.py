@@ -4,246 +4,380 @@ Handles JSON and text/plain payloads, normalizes, and publishes to SQS
 """
 import json
 import uuid
-import boto3
 import logging
-import re
-from datetime import datetime
-from typing import Dict, Any, Tuple, Optional
+import os
+import time
+from botocore.config import Config
+from botocore.session import get_session
+from typing import Dict, Any, Iterator, List, Set, Tuple, Optional
+
+try:
+    # orjson serializes in Rust and is several times faster than the stdlib json module
+    import orjson
+
+    def json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# Level names are case-insensitive; unknown values fall back to INFO instead of failing the cold start
+_log_level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').strip().upper())
+logger.setLevel(_log_level if isinstance(_log_level, int) else logging.INFO)
+# Checked once so suppressed INFO logs skip building and serializing their payloads
+_LOG_INFO = logger.isEnabledFor(logging.INFO)
+
+# Initialize AWS clients during cold start so the first invocation doesn't pay for it
+# Fail fast and keep a warm pool of keep-alive connections instead of botocore's defaults
+# (legacy retry mode, 60s timeouts, 10 pooled connections)
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'max_attempts': 2, 'mode': 'standard'},
+    tcp_keepalive=True,
+    connect_timeout=1,
+    read_timeout=3
+)
+# botocore alone is enough for one low-level client and skips importing boto3 at cold start
+sqs = get_session().create_client('sqs', config=BOTO_CONFIG)
+QUEUE_URL = os.environ['SQS_QUEUE_URL']
+
+# SendMessageBatch accepts at most 10 entries and 256 KiB of payload per call
+SQS_BATCH_LIMIT = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+# Attribute names and data types counted towards the payload size of each entry
+ATTRIBUTE_OVERHEAD_BYTES = 64
+# Upper bound on messages per request (at most 10 SendMessageBatch calls)
+MAX_BATCH_MESSAGES = 100
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def build_error_response(status_code: int, error: str, message: Optional[str] = None) -> Dict[str, Any]:
+    """Build an API Gateway error response with a JSON body"""
+    body = {'error': error}
+    if message is not None:
+        body['message'] = message
+    return {
+        'statusCode': status_code,
+        'body': json_dumps(body),
+        'headers': JSON_HEADERS
+    }
 
-# Initialize AWS clients
-sqs = boto3.client('sqs')
-QUEUE_URL = None  # Will be set via environment variable
 
-def get_queue_url():
-    """Get SQS queue URL from environment"""
-    import os
-    global QUEUE_URL
-    if QUEUE_URL is None:
-        QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
-        if not QUEUE_URL:
-            raise ValueError("SQS_QUEUE_URL environment variable not set")
-    return QUEUE_URL
+def bad_request(message: str) -> Dict[str, Any]:
+    """Build a 400 Bad Request response"""
+    return build_error_response(400, 'Bad Request', message)
 
 
-def validate_and_normalize(event: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+# Responses without request-specific details are built once per container
+RESPONSE_NOT_FOUND = build_error_response(404, 'Not Found')
+RESPONSE_EMPTY_BODY = bad_request('Request body cannot be empty')
+RESPONSE_EMPTY_BATCH = bad_request('messages must be a non-empty array')
+RESPONSE_BATCH_TOO_LARGE = bad_request(f'messages cannot contain more than {MAX_BATCH_MESSAGES} entries')
+RESPONSE_MISSING_TENANT_HEADER = bad_request('X-Tenant-ID header is required for text/plain requests')
+RESPONSE_UNSUPPORTED_CONTENT_TYPE = bad_request('Content-Type must be application/json or text/plain')
+RESPONSE_PUBLISH_FAILED = build_error_response(500, 'Internal Server Error', 'Failed to publish message to queue')
+
+
+# (epoch second, formatted prefix) of the last timestamp, reused until the second changes
+_timestamp_prefix = (0, '')
+
+
+def now_iso() -> str:
+    """
+    Current UTC time as ISO 8601 with milliseconds, e.g. 2024-01-01T12:00:00.123Z
+    The date/time part is formatted at most once per second
+    """
+    global _timestamp_prefix
+    # Round to whole milliseconds first; truncating the float fraction can lose one
+    second, millis = divmod(round(time.time() * 1000), 1000)
+    cached_second, prefix = _timestamp_prefix
+    if second != cached_second:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+        _timestamp_prefix = (second, prefix)
+    return f'{prefix}.{millis:03d}Z'
+
+
+def get_header(headers: Dict[str, str], name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Look up a header by its lowercase name
+    API Gateway HTTP APIs already lowercase header keys, so the case-insensitive scan is only a fallback
+    """
+    value = headers.get(name)
+    if value is None:
+        value = next((v for k, v in headers.items() if k.lower() == name), default)
+    return value
+
+
+def validate_and_normalize(event: Dict[str, Any]) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]:
     """
     Validate and normalize incoming request
-    Returns: (normalized_message, error_response)
+    A JSON payload may carry a top-level "messages" array to ingest several logs at once
+    Returns: (normalized_messages, error_response)
     """
     headers = event.get('headers', {})
     
-    # Normalize header keys to lowercase
-    headers = {k.lower(): v for k, v in headers.items()}
-    
-    content_type = headers.get('content-type', '')
+    content_type = get_header(headers, 'content-type', '')
     body = event.get('body', '')
     
     # Validation: check if body is empty
     if not body or body.strip() == '':
-        return None, {
-            'statusCode': 400,
-            'body': json.dumps({
-                'error': 'Bad Request',
-                'message': 'Request body cannot be empty'
-            }),
-            'headers': {'Content-Type': 'application/json'}
-        }
+        return None, RESPONSE_EMPTY_BODY
     
-    tenant_id = None
-    log_id = None
-    normalized_text = None
+    # (tenant_id, log_id, normalized_text) for each log in the request
+    entries = []
     source = None
     
     # Handle JSON payload
     if 'application/json' in content_type:
         try:
-            payload = json.loads(body)
-            tenant_id = payload.get('tenant_id')
-            log_id = payload.get('log_id')
-            normalized_text = payload.get('text')
-            source = 'json_upload'
+            payload = json_loads(body)
             
-            if not tenant_id:
-                return None, {
-                    'statusCode': 400,
-                    'body': json.dumps({
-                        'error': 'Bad Request',
-                        'message': 'tenant_id is required in JSON payload'
-                    }),
-                    'headers': {'Content-Type': 'application/json'}
-                }
+            if isinstance(payload, dict) and 'messages' in payload:
+                items = payload['messages']
+                source = 'json_batch_upload'
+                if not isinstance(items, list) or not items:
+                    return None, RESPONSE_EMPTY_BATCH
+                if len(items) > MAX_BATCH_MESSAGES:
+                    return None, RESPONSE_BATCH_TOO_LARGE
+            else:
+                items = [payload]
+                source = 'json_upload'
             
-            if not normalized_text:
-                return None, {
-                    'statusCode': 400,
-                    'body': json.dumps({
-                        'error': 'Bad Request',
-                        'message': 'text field is required in JSON payload'
-                    }),
-                    'headers': {'Content-Type': 'application/json'}
-                }
+            for index, item in enumerate(items):
+                # Batch entries inherit the top-level tenant_id unless they set their own
+                location = f' (messages[{index}])' if source == 'json_batch_upload' else ''
+                if not isinstance(item, dict):
+                    return None, bad_request(f'Each message must be a JSON object{location}')
                 
-        except json.JSONDecodeError as e:
-            return None, {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'error': 'Bad Request',
-                    'message': f'Invalid JSON: {str(e)}'
-                }),
-                'headers': {'Content-Type': 'application/json'}
-            }
+                tenant_id = item.get('tenant_id') or payload.get('tenant_id')
+                log_id = item.get('log_id')
+                normalized_text = item.get('text')
+                
+                if not tenant_id:
+                    return None, bad_request(f'tenant_id is required in JSON payload{location}')
+                
+                if not normalized_text:
+                    return None, bad_request(f'text field is required in JSON payload{location}')
+                
+                # IDs become SQS message attributes and DynamoDB string keys
+                if not isinstance(tenant_id, str):
+                    return None, bad_request(f'tenant_id must be a string{location}')
+                
+                if log_id is not None and not isinstance(log_id, str):
+                    return None, bad_request(f'log_id must be a string{location}')
+                
+                if not isinstance(normalized_text, str):
+                    return None, bad_request(f'text field must be a string{location}')
+                
+                entries.append((tenant_id, log_id, normalized_text))
+                
+        except json.JSONDecodeError as e:  # orjson.JSONDecodeError is a subclass
+            return None, bad_request(f'Invalid JSON: {str(e)}')
     
     # Handle text/plain payload
     elif 'text/plain' in content_type:
-        tenant_id = headers.get('x-tenant-id')
+        tenant_id = get_header(headers, 'x-tenant-id')
         if not tenant_id:
-            return None, {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'error': 'Bad Request',
-                    'message': 'X-Tenant-ID header is required for text/plain requests'
-                }),
-                'headers': {'Content-Type': 'application/json'}
-            }
+            return None, RESPONSE_MISSING_TENANT_HEADER
         
-        normalized_text = body
+        entries.append((tenant_id, None, body))
         source = 'text_upload'
     
     else:
-        return None, {
-            'statusCode': 400,
-            'body': json.dumps({
-                'error': 'Bad Request',
-                'message': 'Content-Type must be application/json or text/plain'
-            }),
-            'headers': {'Content-Type': 'application/json'}
-        }
+        return None, RESPONSE_UNSUPPORTED_CONTENT_TYPE
     
-    # Generate IDs if missing
-    if not log_id:
-        log_id = str(uuid.uuid4())
+    request_id = get_header(headers, 'x-request-id') or uuid.uuid4().hex
+    received_at = now_iso()
     
-    request_id = headers.get('x-request-id', str(uuid.uuid4()))
+    # Create normalized messages, generating IDs if missing
+    messages = [
+        {
+            'tenant_id': tenant_id,
+            'log_id': log_id or uuid.uuid4().hex,
+            'normalized_text': normalized_text,
+            'source': source,
+            'received_at': received_at,
+            'request_id': request_id
+        }
+        for tenant_id, log_id, normalized_text in entries
+    ]
     
-    # Create normalized message
-    message = {
-        'tenant_id': tenant_id,
-        'log_id': log_id,
-        'normalized_text': normalized_text,
-        'source': source,
-        'received_at': datetime.utcnow().isoformat() + 'Z',
-        'request_id': request_id
+    return messages, None
+
+
+def build_entry(index: int, message: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Build the SendMessageBatch entry for a message, with its Id set to index
+    Returns: (entry, payload_bytes)
+    """
+    entry = {
+        'Id': str(index),
+        'MessageBody': json_dumps(message),
+        'MessageAttributes': {
+            'tenant_id': {
+                'StringValue': message['tenant_id'],
+                'DataType': 'String'
+            },
+            'log_id': {
+                'StringValue': message['log_id'],
+                'DataType': 'String'
+            }
+        }
     }
+    entry_bytes = (
+        len(entry['MessageBody'].encode('utf-8'))
+        + len(message['tenant_id'].encode('utf-8'))
+        + len(message['log_id'].encode('utf-8'))
+        + ATTRIBUTE_OVERHEAD_BYTES
+    )
+    return entry, entry_bytes
+
+
+def batch_entries(entries: List[Tuple[Dict[str, Any], int]]) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Group (entry, payload_bytes) pairs into SendMessageBatch requests that respect
+    the SQS per-call limits on entry count and total payload size
+    """
+    batch = []
+    batch_bytes = 0
+    for entry, entry_bytes in entries:
+        if batch and (len(batch) == SQS_BATCH_LIMIT or batch_bytes + entry_bytes > SQS_BATCH_MAX_BYTES):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += entry_bytes
+    if batch:
+        yield batch
+
+
+def publish_to_sqs(messages: List[Dict[str, Any]]) -> Set[int]:
+    """
+    Publish normalized messages to SQS queue with SendMessageBatch
+    Returns the indices of the messages that could not be published
+    """
+    # (index, error) of every message that could not be published
+    results = []
+    built = []
+    for index, message in enumerate(messages):
+        try:
+            built.append(build_entry(index, message))
+        except Exception as e:
+            # e.g. orjson rejects a lone surrogate; only this message fails
+            results.append((index, str(e)))
     
-    return message, None
-
-
-def publish_to_sqs(message: Dict[str, Any]) -> bool:
-    """Publish normalized message to SQS queue"""
-    try:
-        queue_url = get_queue_url()
-        response = sqs.send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(message),
-            MessageAttributes={
-                'tenant_id': {
-                    'StringValue': message['tenant_id'],
-                    'DataType': 'String'
-                },
-                'log_id': {
-                    'StringValue': message['log_id'],
-                    'DataType': 'String'
-                }
-            }
-        )
-        
-        logger.info(json.dumps({
-            'event': 'message_published',
+    for entries in batch_entries(built):
+        try:
+            response = sqs.send_message_batch(QueueUrl=QUEUE_URL, Entries=entries)
+            
+            for result in response.get('Successful', []):
+                message = messages[int(result['Id'])]
+                if _LOG_INFO:
+                    logger.info(json_dumps({
+                        'event': 'message_published',
+                        'tenant_id': message['tenant_id'],
+                        'log_id': message['log_id'],
+                        'request_id': message['request_id'],
+                        'message_id': result.get('MessageId')
+                    }))
+            
+            results.extend(
+                (int(result['Id']), result.get('Message') or result.get('Code'))
+                for result in response.get('Failed', [])
+            )
+            
+        except Exception as e:
+            results.extend((int(entry['Id']), str(e)) for entry in entries)
+    
+    for index, error in results:
+        message = messages[index]
+        logger.error(json_dumps({
+            'event': 'publish_failed',
             'tenant_id': message['tenant_id'],
             'log_id': message['log_id'],
-            'request_id': message['request_id'],
-            'message_id': response.get('MessageId')
+            'error': error
         }))
-        
-        return True
-        
-    except Exception as e:
-        logger.error(json.dumps({
-            'event': 'publish_failed',
-            'tenant_id': message.get('tenant_id'),
-            'log_id': message.get('log_id'),
-            'error': str(e)
-        }))
-        return False
+    
+    return {index for index, _ in results}
 
 
 def lambda_handler(event, context):
     """
     Lambda handler for API Gateway HTTP API
     """
-    logger.info(json.dumps({
-        'event': 'request_received',
-        'path': event.get('rawPath'),
-        'method': event.get('requestContext', {}).get('http', {}).get('method')
-    }))
+    if _LOG_INFO:
+        logger.info(json_dumps({
+            'event': 'request_received',
+            'path': event.get('rawPath'),
+            'method': event.get('requestContext', {}).get('http', {}).get('method')
+        }))
     
     # Only handle POST /ingest
     http_method = event.get('requestContext', {}).get('http', {}).get('method')
     path = event.get('rawPath', '')
     
     if http_method != 'POST' or path != '/ingest':
-        return {
-            'statusCode': 404,
-            'body': json.dumps({'error': 'Not Found'}),
-            'headers': {'Content-Type': 'application/json'}
-        }
+        return RESPONSE_NOT_FOUND
     
     # Validate and normalize
-    message, error_response = validate_and_normalize(event)
+    messages, error_response = validate_and_normalize(event)
     
     if error_response:
-        logger.warning(json.dumps({
+        logger.warning(json_dumps({
             'event': 'validation_failed',
             'status_code': error_response['statusCode']
         }))
         return error_response
     
     # Publish to SQS
-    success = publish_to_sqs(message)
+    failed = publish_to_sqs(messages)
     
-    if not success:
-        logger.error(json.dumps({
-            'event': 'ingest_rejected',
-            'tenant_id': message['tenant_id'],
-            'log_id': message['log_id']
-        }))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'error': 'Internal Server Error',
-                'message': 'Failed to publish message to queue'
-            }),
-            'headers': {'Content-Type': 'application/json'}
-        }
+    if len(failed) == len(messages):
+        for message in messages:
+            logger.error(json_dumps({
+                'event': 'ingest_rejected',
+                'tenant_id': message['tenant_id'],
+                'log_id': message['log_id']
+            }))
+        return RESPONSE_PUBLISH_FAILED
     
-    # Return 202 Accepted
-    logger.info(json.dumps({
-        'event': 'ingest_accepted',
-        'tenant_id': message['tenant_id'],
-        'log_id': message['log_id'],
-        'request_id': message['request_id']
-    }))
+    request_id = messages[0]['request_id']
+    accepted = [message for index, message in enumerate(messages) if index not in failed]
+    accepted_ids = [message['log_id'] for message in accepted]
+    failed_ids = [messages[index]['log_id'] for index in sorted(failed)]
+    
+    # Return 202 Accepted; batch entries may belong to different tenants, so log each one
+    if _LOG_INFO:
+        for message in accepted:
+            logger.info(json_dumps({
+                'event': 'ingest_accepted',
+                'tenant_id': message['tenant_id'],
+                'log_id': message['log_id'],
+                'request_id': request_id
+            }))
+    
+    if messages[0]['source'] != 'json_batch_upload':
+        body = {
+            'status': 'accepted',
+            'log_id': accepted_ids[0],
+            'request_id': request_id
+        }
+    else:
+        # Batch requests are accepted partially; clients resend the failed log_ids
+        body = {
+            'status': 'accepted',
+            'log_ids': accepted_ids,
+            'failed_log_ids': failed_ids,
+            'request_id': request_id
+        }
     
     return {
         'statusCode': 202,
-        'body': json.dumps({
-            'status': 'accepted',
-            'log_id': message['log_id'],
-            'request_id': message['request_id']
-        }),
-        'headers': {'Content-Type': 'application/json'}
+        'body': json_dumps(body),
+        'headers': JSON_HEADERS
     }
@@ -46,6 +46,11 @@ if [ "$confirm" != "yes" ]; then
 fi
 echo ""
 
+# Build shared dependency layer
+echo "📦 Building Lambda dependency layer..."
+bash scripts/build_layer.sh
+echo ""
+
 # Deploy with Terraform
 echo "🏗️  Deploying infrastructure..."
 cd infra
@@ -44,6 +44,12 @@ variable "project_name" {
   default     = "robust-data-processor"
 }
 
+variable "api_provisioned_concurrency" {
+  description = "Provisioned concurrency for the API Lambda (0 uses SnapStart instead)"
+  type        = number
+  default     = 0
+}
+
 # DynamoDB Table for processed logs
 resource "aws_dynamodb_table" "processed_logs" {
   name         = "${var.project_name}-processed-logs"
@@ -178,6 +184,7 @@ resource "aws_iam_role_policy" "worker_lambda_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
           "dynamodb:UpdateItem"
         ]
@@ -193,6 +200,20 @@ resource "aws_iam_role_policy_attachment" "worker_lambda_basic" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+# Shared dependency layer (botocore, orjson, google-re2) - build with scripts/build_layer.sh
+data "archive_file" "deps_layer_zip" {
+  type        = "zip"
+  source_dir  = "${path.module}/../build/layer"
+  output_path = "${path.module}/deps_layer.zip"
+}
+
+resource "aws_lambda_layer_version" "deps_layer" {
+  layer_name          = "${var.project_name}-deps"
+  filename            = data.archive_file.deps_layer_zip.output_path
+  source_code_hash    = data.archive_file.deps_layer_zip.output_base64sha256
+  compatible_runtimes = ["python3.12"]
+}
+
 # Archive API Lambda code
 data "archive_file" "api_lambda_zip" {
   type        = "zip"
@@ -207,9 +228,19 @@ resource "aws_lambda_function" "api_lambda" {
   role             = aws_iam_role.api_lambda_role.arn
   handler          = "handler.lambda_handler"
   source_code_hash = data.archive_file.api_lambda_zip.output_base64sha256
-  runtime          = "python3.11"
+  runtime          = "python3.12"
   timeout          = 30
   memory_size      = 512
+  layers           = [aws_lambda_layer_version.deps_layer.arn]
+  publish          = true
+
+  # SnapStart and provisioned concurrency can't be combined on the same version
+  dynamic "snap_start" {
+    for_each = var.api_provisioned_concurrency > 0 ? [] : [1]
+    content {
+      apply_on = "PublishedVersions"
+    }
+  }
 
   environment {
     variables = {
@@ -222,6 +253,21 @@ resource "aws_lambda_function" "api_lambda" {
   }
 }
 
+# Alias pointing at the latest published API version (SnapStart and provisioned concurrency apply to versions)
+resource "aws_lambda_alias" "api_live" {
+  name             = "live"
+  function_name    = aws_lambda_function.api_lambda.function_name
+  function_version = aws_lambda_function.api_lambda.version
+}
+
+# Pre-initialized API environments for latency-critical traffic
+resource "aws_lambda_provisioned_concurrency_config" "api_lambda" {
+  count                             = var.api_provisioned_concurrency > 0 ? 1 : 0
+  function_name                     = aws_lambda_alias.api_live.function_name
+  qualifier                         = aws_lambda_alias.api_live.name
+  provisioned_concurrent_executions = var.api_provisioned_concurrency
+}
+
 # CloudWatch Log Group for API Lambda
 resource "aws_cloudwatch_log_group" "api_lambda_logs" {
   name              = "/aws/lambda/${aws_lambda_function.api_lambda.function_name}"
@@ -242,10 +288,16 @@ resource "aws_lambda_function" "worker_lambda" {
   role             = aws_iam_role.worker_lambda_role.arn
   handler          = "handler.lambda_handler"
   source_code_hash = data.archive_file.worker_lambda_zip.output_base64sha256
-  runtime          = "python3.11"
+  runtime          = "python3.12"
   timeout          = 900 # 15 minutes max
   memory_size      = 1024
+  layers           = [aws_lambda_layer_version.deps_layer.arn]
+  publish          = true
 
+  # Restore from a snapshot of the initialized function instead of re-running imports
+  snap_start {
+    apply_on = "PublishedVersions"
+  }
 
   environment {
     variables = {
@@ -258,6 +310,13 @@ resource "aws_lambda_function" "worker_lambda" {
   }
 }
 
+# Alias pointing at the latest published worker version (SnapStart only applies to versions)
+resource "aws_lambda_alias" "worker_live" {
+  name             = "live"
+  function_name    = aws_lambda_function.worker_lambda.function_name
+  function_version = aws_lambda_function.worker_lambda.version
+}
+
 # CloudWatch Log Group for Worker Lambda
 resource "aws_cloudwatch_log_group" "worker_lambda_logs" {
   name              = "/aws/lambda/${aws_lambda_function.worker_lambda.function_name}"
@@ -267,7 +326,7 @@ resource "aws_cloudwatch_log_group" "worker_lambda_logs" {
 # SQS Event Source Mapping for Worker Lambda
 resource "aws_lambda_event_source_mapping" "sqs_trigger" {
   event_source_arn = aws_sqs_queue.processing_queue.arn
-  function_name    = aws_lambda_function.worker_lambda.arn
+  function_name    = aws_lambda_alias.worker_live.arn
   batch_size       = 10
 
   # Enable partial batch response
@@ -295,7 +354,7 @@ resource "aws_apigatewayv2_api" "http_api" {
 resource "aws_apigatewayv2_integration" "lambda_integration" {
   api_id                 = aws_apigatewayv2_api.http_api.id
   integration_type       = "AWS_PROXY"
-  integration_uri        = aws_lambda_function.api_lambda.invoke_arn
+  integration_uri        = aws_lambda_alias.api_live.invoke_arn
   payload_format_version = "2.0"
 }
 
@@ -338,6 +397,7 @@ resource "aws_lambda_permission" "api_gateway_invoke" {
   statement_id  = "AllowAPIGatewayInvoke"
   action        = "lambda:InvokeFunction"
   function_name = aws_lambda_function.api_lambda.function_name
+  qualifier     = aws_lambda_alias.api_live.name
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_apigatewayv2_api.http_api.execution_arn}/*/*"
 }
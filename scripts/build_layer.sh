@@ -0,0 +1,35 @@
+#!/bin/bash
+# Build the shared Lambda dependency layer (botocore, orjson, google-re2)
+# Terraform packages build/layer into the layer used by both functions
+
+set -e  # Exit on error
+
+ROOT_DIR="$(cd "$(dirname "$0")/.." && pwd)"
+LAYER_DIR="$ROOT_DIR/build/layer"
+
+if [ -z "$PYTHON_VERSION" ]; then
+    PYTHON_VERSION="3.12"
+fi
+
+echo "Building Lambda layer for Python $PYTHON_VERSION"
+echo "========================================"
+
+rm -rf "$LAYER_DIR"
+mkdir -p "$LAYER_DIR/python"
+
+# Install Linux x86_64 wheels matching the Lambda runtime, whatever the build host is
+# Pinned versions without dependency resolution and without .pyc files (which embed
+# install-time mtimes) keep the layer zip byte-identical across builds
+pip install \
+    -r "$ROOT_DIR/scripts/layer-requirements.txt" \
+    --target "$LAYER_DIR/python" \
+    --platform manylinux2014_x86_64 \
+    --platform manylinux_2_28_x86_64 \
+    --implementation cp \
+    --python-version "$PYTHON_VERSION" \
+    --only-binary=:all: \
+    --no-deps \
+    --no-compile \
+    --quiet
+
+echo "✅ Layer built in $LAYER_DIR ($(du -sh "$LAYER_DIR" | cut -f1))"
@@ -0,0 +1,57 @@
+"""
+Shared fixtures that load the real API and Worker handlers
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+
+def load_handler(package, monkeypatch, **env):
+    """
+    Import api/handler.py or worker/handler.py as a fresh module
+    AWS clients are created at import time, so the environment is set first
+    """
+    pytest.importorskip('botocore')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    spec = importlib.util.spec_from_file_location(
+        f'{package}_handler', os.path.join(ROOT_DIR, package, 'handler.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Worker handler module with retry backoff disabled"""
+    module = load_handler('worker', monkeypatch, DYNAMODB_TABLE_NAME='logs')
+    monkeypatch.setattr(module.time, 'sleep', lambda seconds: None)
+    return module
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """API handler module"""
+    return load_handler('api', monkeypatch, SQS_QUEUE_URL='https://sqs.example/queue')
+
+
+@pytest.fixture(params=['re2', 're'])
+def redact(request, monkeypatch):
+    """
+    The worker's redact_phone_numbers under each regex engine
+    re2 ships in the Lambda layer; re is the fallback when it is not installed
+    """
+    if request.param == 're2':
+        pytest.importorskip('re2')
+    else:
+        # A None entry makes "import re2" raise ImportError
+        monkeypatch.setitem(sys.modules, 're2', None)
+    module = load_handler('worker', monkeypatch, DYNAMODB_TABLE_NAME='logs')
+    assert module.re.__name__ == request.param
+    return module.redact_phone_numbers
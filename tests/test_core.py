@@ -1,71 +1,74 @@
 """
 Core unit tests for robust data processor
-Tests phone number redaction without external dependencies
+Redaction tests run the worker handler under both google-re2 and the stdlib re fallback
 """
 import re
 import pytest
 
 
-def redact_phone_numbers(text: str) -> str:
-    """
-    Redact phone numbers from text
-    Matches: (555) 555-1234, 555-555-1234, 555-0199
-    """
-    patterns = [
-        r'\(\d{3}\)\s?\d{3}[-.]?\d{4}',  # (555) 555-1234
-        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b',  # 555-555-1234
-        r'\b\d{3}[-.]?\d{4}\b',  # 555-0199
-    ]
-    
-    redacted = text
-    for pattern in patterns:
-        redacted = re.sub(pattern, '[REDACTED]', redacted)
-    
-    return redacted
-
-
 class TestPhoneRedaction:
-    """Test phone number redaction logic"""
+    """Test the worker's phone number redaction under both regex engines"""
     
-    def test_redact_simple_format(self):
+    def test_redact_simple_format(self, redact):
         """Test 555-0199 format"""
         text = "User 555-0199 accessed system"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert "[REDACTED]" in result
         assert "555-0199" not in result
         assert result == "User [REDACTED] accessed system"
     
-    def test_redact_full_format(self):
+    def test_redact_full_format(self, redact):
         """Test 555-555-1234 format"""
         text = "Call 555-555-1234"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert result == "Call [REDACTED]"
     
-    def test_redact_parentheses_format(self):
+    def test_redact_parentheses_format(self, redact):
         """Test (555) 555-1234 format"""
         text = "Contact (555) 555-1234"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert result == "Contact [REDACTED]"
     
-    def test_redact_multiple_phones(self):
+    def test_redact_multiple_phones(self, redact):
         """Test multiple phone numbers"""
         text = "Call 555-0199 or 555-0100"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert result.count("[REDACTED]") == 2
         assert "555-0199" not in result
         assert "555-0100" not in result
     
-    def test_preserve_non_phone_numbers(self):
+    def test_preserve_non_phone_numbers(self, redact):
         """Test non-phone numbers are preserved"""
         text = "Order #12345 costs $99.99"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert "12345" in result
         assert "99.99" in result
     
-    def test_example_from_spec(self):
+    def test_mixed_formats_single_pass(self, redact):
+        """Test all formats are redacted by one substitution"""
+        text = "Call (555) 555-1234, 555-555-1234 or 555-0199"
+        result = redact(text)
+        assert result == "Call [REDACTED], [REDACTED] or [REDACTED]"
+
+    def test_digits_without_phone_unchanged(self, redact):
+        """Test text with digits but no phone number is returned as-is"""
+        text = "Order #12345 costs $99.99"
+        assert redact(text) is text
+
+    def test_non_ascii_digits_preserved(self, redact):
+        """Test only ASCII digits are treated as phone numbers"""
+        text = "Ref \u0665\u0665\u0665-\u0660\u0661\u0669\u0669"
+        assert redact(text) == text
+
+    def test_text_without_digits_unchanged(self, redact):
+        """Test text with no digit runs is returned as-is"""
+        text = "User admin accessed /api/login"
+        assert redact(text) is text
+
+    def test_example_from_spec(self, redact):
         """Test exact example from specification"""
         text = "User 555-0199 accessed /api/login"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         expected = "User [REDACTED] accessed /api/login"
         assert result == expected
 
@@ -78,12 +81,27 @@ class TestNormalization:
         payload = {"log_id": "123", "text": "test"}
         assert "tenant_id" not in payload  # Should fail validation
     
-    def test_log_id_generation(self):
-        """Verify log_id can be generated if missing"""
-        import uuid
-        log_id = str(uuid.uuid4())
-        assert len(log_id) == 36  # UUID format
-        assert "-" in log_id
+    def test_log_id_generation(self, api):
+        """Verify the API generates 32-char hex log_id and request_id when missing"""
+        event = {
+            "headers": {"content-type": "application/json"},
+            "body": '{"tenant_id": "acme", "text": "test"}'
+        }
+        messages, error = api.validate_and_normalize(event)
+        assert error is None
+        assert re.fullmatch(r"[0-9a-f]{32}", messages[0]["log_id"])
+        assert re.fullmatch(r"[0-9a-f]{32}", messages[0]["request_id"])
+    
+    def test_supplied_ids_kept(self, api):
+        """Verify a supplied log_id and X-Request-ID header are used as-is"""
+        event = {
+            "headers": {"content-type": "application/json", "x-request-id": "req-123"},
+            "body": '{"tenant_id": "acme", "log_id": "log-001", "text": "test"}'
+        }
+        messages, error = api.validate_and_normalize(event)
+        assert error is None
+        assert messages[0]["log_id"] == "log-001"
+        assert messages[0]["request_id"] == "req-123"
 
 
 class TestTenantIsolation:
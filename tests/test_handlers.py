@@ -3,80 +3,160 @@ Unit tests for API normalization and Worker redaction logic
 Run with: pytest test_handlers.py
 """
 import json
+import logging
 import pytest
+import re
 import sys
 import os
-import re
+
+from conftest import load_handler
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 
-# Import redaction function directly (copied to avoid boto3 dependency in tests)
-def redact_phone_numbers(text: str) -> str:
+class StubSQS:
+    """Stands in for the SQS client; fail(entry) returns an error code for entries to reject"""
+    
+    def __init__(self, fail=lambda entry: None, error=None):
+        self.fail = fail
+        self.error = error
+        self.calls = []
+    
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append(Entries)
+        if self.error:
+            raise self.error
+        successful, failed = [], []
+        for entry in Entries:
+            code = self.fail(entry)
+            if code:
+                failed.append({'Id': entry['Id'], 'Code': code, 'SenderFault': False})
+            else:
+                successful.append({'Id': entry['Id'], 'MessageId': f"msg-{entry['Id']}"})
+        return {'Successful': successful, 'Failed': failed}
+
+
+def ingest_event(payload, content_type='application/json'):
+    """Build an API Gateway HTTP API event for POST /ingest"""
+    return {
+        'rawPath': '/ingest',
+        'requestContext': {'http': {'method': 'POST'}},
+        'headers': {'content-type': content_type},
+        'body': payload if isinstance(payload, str) else json.dumps(payload)
+    }
+
+
+class StubDynamoDB:
     """
-    Redact phone numbers from text
-    Matches common phone number patterns
+    Stands in for the DynamoDB client; unprocessed(requests) picks items to hand back
+    Items whose original_text exceeds max_text are rejected like DynamoDB's 400 KB item limit
     """
-    # Order matters - match longer patterns first
-    patterns = [
-        r'\(\d{3}\)\s?\d{3}[-.]?\d{4}',  # (555) 555-1234
-        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b',  # 555-555-1234
-        r'\b\d{3}[-.]?\d{4}\b',  # 555-0199
-    ]
     
-    redacted = text
-    for pattern in patterns:
-        redacted = re.sub(pattern, '[REDACTED]', redacted)
+    def __init__(self, unprocessed=lambda requests: [], max_text=None):
+        self.unprocessed = unprocessed
+        self.max_text = max_text
+        self.batch_calls = []
+        self.put_calls = []
     
-    return redacted
+    def validate(self, item, operation):
+        from botocore.exceptions import ClientError, ParamValidationError
+        # botocore checks parameter types before sending the request
+        for name, value in item.items():
+            if 'S' in value and not isinstance(value['S'], str):
+                raise ParamValidationError(report=f'Invalid type for parameter Item.{name}.S')
+        if self.max_text is not None and len(item['original_text']['S']) > self.max_text:
+            raise ClientError(
+                {'Error': {'Code': 'ValidationException', 'Message': 'Item size has exceeded the maximum size'}},
+                operation
+            )
+    
+    def batch_write_item(self, RequestItems):
+        requests = RequestItems['logs']
+        self.batch_calls.append(requests)
+        for request in requests:
+            self.validate(request['PutRequest']['Item'], 'BatchWriteItem')
+        unprocessed = self.unprocessed(requests)
+        return {'UnprocessedItems': {'logs': unprocessed} if unprocessed else {}}
+    
+    def put_item(self, TableName, Item):
+        self.put_calls.append(Item)
+        self.validate(Item, 'PutItem')
+        return {}
+
+
+def sqs_record(message_id, log_id, text='User 555-0199 logged in', **fields):
+    """Build an SQS record as delivered to the worker; fields override message body values"""
+    return {
+        'messageId': message_id,
+        'receiptHandle': 'handle',
+        'body': json.dumps({
+            'tenant_id': 'acme',
+            'log_id': log_id,
+            'normalized_text': text,
+            'source': 'json_upload',
+            'received_at': '2024-01-01T00:00:00.000Z',
+            'request_id': 'req-1',
+            **fields
+        }),
+        'attributes': {'ApproximateReceiveCount': '1'}
+    }
 
 
 class TestPhoneRedaction:
-    """Test phone number redaction logic"""
+    """Test phone number redaction in the worker under both regex engines"""
     
-    def test_redact_simple_format(self):
+    def test_redact_simple_format(self, redact):
         """Test 555-0199 format"""
         text = "User 555-0199 accessed the system"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert "[REDACTED]" in result
         assert "555-0199" not in result
     
-    def test_redact_full_format(self):
+    def test_redact_full_format(self, redact):
         """Test 555-555-1234 format"""
         text = "Call 555-555-1234 for support"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert "[REDACTED]" in result
         assert "555-555-1234" not in result
     
-    def test_redact_parentheses_format(self):
+    def test_redact_parentheses_format(self, redact):
         """Test (555) 555-1234 format"""
         text = "Contact: (555) 555-1234"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert "[REDACTED]" in result
         assert "(555) 555-1234" not in result
     
-    def test_redact_multiple_phones(self):
+    def test_redact_multiple_phones(self, redact):
         """Test multiple phone numbers in text"""
         text = "Call 555-0199 or 555-0100 for help"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert result.count("[REDACTED]") == 2
         assert "555-0199" not in result
         assert "555-0100" not in result
     
-    def test_preserve_non_phone_numbers(self):
+    def test_preserve_non_phone_numbers(self, redact):
         """Test that non-phone numbers are preserved"""
         text = "Order #12345 costs $99.99"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         assert "12345" in result
         assert "99.99" in result
     
-    def test_example_from_spec(self):
+    def test_example_from_spec(self, redact):
         """Test exact example from spec"""
         text = "User 555-0199 accessed /api/login"
-        result = redact_phone_numbers(text)
+        result = redact(text)
         expected = "User [REDACTED] accessed /api/login"
         assert result == expected
+    
+    @pytest.mark.parametrize('text', [
+        "Call 555 555\v1234",
+        "Call (555)\v555-1234",
+        "Call 555\f555\t1234",
+    ])
+    def test_redact_any_whitespace_separator(self, redact, text):
+        """Test every ASCII whitespace character separates phone digits under both engines"""
+        assert redact(text) == "Call [REDACTED]"
 
 
 class TestNormalization:
@@ -164,5 +244,305 @@ class TestTenantIsolation:
         # This ensures physical separation in DynamoDB
 
 
+class TestWorkerBatchWrites:
+    """Test batched DynamoDB writes in the worker"""
+    
+    def test_batch_stored_in_one_call(self, worker):
+        """Test a batch of records is written with a single BatchWriteItem call"""
+        worker.ddb = StubDynamoDB()
+        records = [sqs_record(f'm{i}', f'log-{i}') for i in range(3)]
+        
+        result = worker.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': []}
+        assert len(worker.ddb.batch_calls) == 1
+        item = worker.ddb.batch_calls[0][0]['PutRequest']['Item']
+        assert item['modified_data'] == {'S': 'User [REDACTED] logged in'}
+    
+    def test_unprocessed_items_are_retried(self, worker):
+        """Test items DynamoDB hands back as unprocessed are resent"""
+        worker.ddb = StubDynamoDB(lambda requests: requests[:1] if len(requests) > 1 else [])
+        records = [sqs_record(f'm{i}', f'log-{i}') for i in range(3)]
+        
+        result = worker.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': []}
+        assert [len(call) for call in worker.ddb.batch_calls] == [3, 1]
+    
+    def test_unprocessed_after_retries_fails_only_that_message(self, worker):
+        """Test items still unprocessed after retries map back to their messageIds"""
+        def unprocessed(requests):
+            return [r for r in requests if r['PutRequest']['Item']['log_id']['S'] == 'log-1']
+        worker.ddb = StubDynamoDB(unprocessed)
+        records = [sqs_record(f'm{i}', f'log-{i}') for i in range(3)]
+        
+        result = worker.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'm1'}]}
+        assert len(worker.ddb.batch_calls) == worker.MAX_UNPROCESSED_RETRIES + 1
+    
+    def test_oversized_item_fails_only_that_message(self, worker):
+        """Test an item DynamoDB rejects as invalid does not fail the rest of the batch"""
+        worker.ddb = StubDynamoDB(max_text=100)
+        records = [sqs_record(f'm{i}', f'log-{i}') for i in range(3)]
+        records.append(sqs_record('m3', 'log-3', text='x' * 101))
+        
+        result = worker.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'm3'}]}
+        assert len(worker.ddb.put_calls) == 4
+    
+    def test_non_string_field_fails_only_that_message(self, worker):
+        """Test a record with a non-string attribute is not sent with the rest of the batch"""
+        worker.ddb = StubDynamoDB()
+        records = [sqs_record('m0', 'log-0'), sqs_record('m1', 'log-1', request_id=None), sqs_record('m2', 'log-2')]
+        
+        result = worker.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'm1'}]}
+        assert len(worker.ddb.batch_calls) == 1
+        assert len(worker.ddb.batch_calls[0]) == 2
+    
+    def test_param_validation_error_falls_back_to_put_item(self, worker):
+        """Test a batch botocore refuses to send is retried item by item"""
+        worker.ddb = StubDynamoDB()
+        good = {'tenant_id': {'S': 'acme'}, 'log_id': {'S': 'log-0'}, 'original_text': {'S': 'ok'}}
+        bad = dict(good, log_id={'S': 'log-1'}, request_id={'S': 5})
+        
+        failed = worker.write_batch([{'PutRequest': {'Item': good}}, {'PutRequest': {'Item': bad}}])
+        
+        assert failed == [('acme', 'log-1')]
+        assert len(worker.ddb.put_calls) == 2
+    
+    def test_malformed_message_fails_only_that_record(self, worker):
+        """Test a record that cannot be parsed is not written and does not block the others"""
+        worker.ddb = StubDynamoDB()
+        records = [sqs_record('m0', 'log-0'), dict(sqs_record('m1', 'log-1'), body='not json')]
+        
+        result = worker.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'm1'}]}
+        assert len(worker.ddb.batch_calls[0]) == 1
+
+
+class TestApiBatchPublishing:
+    """Test batch ingestion and SendMessageBatch publishing in the API"""
+    
+    def test_single_message_response_unchanged(self, api):
+        """Test a single JSON log keeps the log_id response shape"""
+        api.sqs = StubSQS()
+        
+        response = api.lambda_handler(ingest_event({'tenant_id': 'acme', 'log_id': 'log-1', 'text': 'hi'}), None)
+        
+        assert response['statusCode'] == 202
+        body = json.loads(response['body'])
+        assert body['status'] == 'accepted'
+        assert body['log_id'] == 'log-1'
+        assert len(api.sqs.calls) == 1
+    
+    def test_batch_entries_inherit_tenant(self, api):
+        """Test batch entries use the top-level tenant_id unless they set their own"""
+        api.sqs = StubSQS()
+        payload = {'tenant_id': 'acme', 'messages': [{'text': 'a'}, {'tenant_id': 'beta_inc', 'text': 'b'}]}
+        
+        response = api.lambda_handler(ingest_event(payload), None)
+        
+        assert response['statusCode'] == 202
+        bodies = [json.loads(entry['MessageBody']) for entry in api.sqs.calls[0]]
+        assert [b['tenant_id'] for b in bodies] == ['acme', 'beta_inc']
+        assert {b['source'] for b in bodies} == {'json_batch_upload'}
+    
+    def test_batch_chunked_by_entry_count(self, api):
+        """Test SendMessageBatch calls carry at most 10 entries"""
+        api.sqs = StubSQS()
+        payload = {'tenant_id': 'acme', 'messages': [{'text': f'log {i}'} for i in range(25)]}
+        
+        api.lambda_handler(ingest_event(payload), None)
+        
+        assert [len(call) for call in api.sqs.calls] == [10, 10, 5]
+    
+    def test_batch_chunked_by_payload_size(self, api):
+        """Test SendMessageBatch calls stay under the 256 KiB payload limit"""
+        api.sqs = StubSQS()
+        payload = {'tenant_id': 'acme', 'messages': [{'text': 'x' * 100 * 1024} for _ in range(4)]}
+        
+        api.lambda_handler(ingest_event(payload), None)
+        
+        assert [len(call) for call in api.sqs.calls] == [2, 2]
+    
+    def test_failed_entries_reported_in_partial_response(self, api):
+        """Test failed entry Ids map back to their log_ids in a 202 response"""
+        api.sqs = StubSQS(lambda entry: 'InternalError' if entry['Id'] in ('1', '12') else None)
+        payload = {'tenant_id': 'acme', 'messages': [{'log_id': f'log-{i}', 'text': 'x'} for i in range(15)]}
+        
+        response = api.lambda_handler(ingest_event(payload), None)
+        
+        assert response['statusCode'] == 202
+        body = json.loads(response['body'])
+        assert body['failed_log_ids'] == ['log-1', 'log-12']
+        assert len(body['log_ids']) == 13
+        assert 'log-1' not in body['log_ids']
+    
+    def test_identical_entries_tracked_separately(self, api):
+        """Test a failed entry does not hide an identical entry that was queued"""
+        api.sqs = StubSQS(lambda entry: 'InternalError' if entry['Id'] == '0' else None)
+        payload = {'tenant_id': 'acme', 'messages': [{'log_id': 'dup', 'text': 'x'}] * 2}
+        
+        body = json.loads(api.lambda_handler(ingest_event(payload), None)['body'])
+        
+        assert body['log_ids'] == ['dup']
+        assert body['failed_log_ids'] == ['dup']
+    
+    def test_all_entries_failed_returns_500(self, api):
+        """Test a request with nothing queued is rejected"""
+        api.sqs = StubSQS(error=RuntimeError('queue unavailable'))
+        payload = {'tenant_id': 'acme', 'messages': [{'text': 'a'}, {'text': 'b'}]}
+        
+        response = api.lambda_handler(ingest_event(payload), None)
+        
+        assert response['statusCode'] == 500
+    
+    def test_unserializable_message_fails_only_itself(self, api):
+        """Test a message that cannot be serialized is reported as failed, not raised"""
+        pytest.importorskip('orjson')
+        api.sqs = StubSQS()
+        messages = [
+            {'tenant_id': 'acme', 'log_id': f'log-{i}', 'normalized_text': text, 'request_id': 'req-1'}
+            for i, text in enumerate(['ok', 'lone \ud800 surrogate', 'ok'])
+        ]
+        
+        assert api.publish_to_sqs(messages) == {1}
+        assert [entry['Id'] for entry in api.sqs.calls[0]] == ['0', '2']
+    
+    def test_unserializable_text_body_returns_500(self, api):
+        """Test a text/plain body orjson cannot encode gets a JSON error response"""
+        pytest.importorskip('orjson')
+        api.sqs = StubSQS()
+        event = ingest_event('lone \ud800 surrogate', content_type='text/plain')
+        event['headers']['x-tenant-id'] = 'acme'
+        
+        response = api.lambda_handler(event, None)
+        
+        assert response['statusCode'] == 500
+        assert api.sqs.calls == []
+    
+    def test_batch_size_limit(self, api):
+        """Test requests over the message limit are rejected before publishing"""
+        api.sqs = StubSQS()
+        payload = {'tenant_id': 'acme', 'messages': [{'text': 'x'}] * (api.MAX_BATCH_MESSAGES + 1)}
+        
+        response = api.lambda_handler(ingest_event(payload), None)
+        
+        assert response['statusCode'] == 400
+        assert api.sqs.calls == []
+    
+    @pytest.mark.parametrize('payload, field', [
+        ({'tenant_id': 'acme', 'log_id': 5, 'text': 'x'}, 'log_id'),
+        ({'tenant_id': 5, 'text': 'x'}, 'tenant_id'),
+        ({'tenant_id': 'acme', 'text': ['x']}, 'text'),
+        ({'tenant_id': 'acme', 'messages': [{'log_id': 7, 'text': 'x'}]}, 'log_id'),
+    ])
+    def test_non_string_fields_rejected(self, api, payload, field):
+        """Test non-string IDs and text return 400 instead of failing to publish"""
+        api.sqs = StubSQS()
+        
+        response = api.lambda_handler(ingest_event(payload), None)
+        
+        assert response['statusCode'] == 400
+        assert field in json.loads(response['body'])['message']
+
+
+@pytest.mark.parametrize('handler', ['api', 'worker'])
+class TestTimestamps:
+    """Test now_iso, which formats received_at and processed_at in both handlers"""
+    
+    # 2024-01-01T12:00:00Z
+    NOON = 1704110400
+    
+    def now_iso_at(self, module, monkeypatch, *times):
+        """Return now_iso() for each of the given epoch times"""
+        clock = iter(times)
+        monkeypatch.setattr(module.time, 'time', lambda: next(clock))
+        return [module.now_iso() for _ in times]
+    
+    def test_iso_format(self, handler, request):
+        """Test timestamps are ISO 8601 UTC with milliseconds"""
+        module = request.getfixturevalue(handler)
+        assert re.fullmatch(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z', module.now_iso())
+    
+    def test_milliseconds_zero_padded(self, handler, request, monkeypatch):
+        """Test milliseconds are rounded and padded to three digits"""
+        module = request.getfixturevalue(handler)
+        
+        stamps = self.now_iso_at(module, monkeypatch, self.NOON + 0.007, self.NOON + 0.05, self.NOON + 0.9996)
+        
+        assert stamps == [
+            '2024-01-01T12:00:00.007Z',
+            '2024-01-01T12:00:00.050Z',
+            '2024-01-01T12:00:01.000Z'
+        ]
+    
+    def test_prefix_rebuilt_when_second_changes(self, handler, request, monkeypatch):
+        """Test the cached date/time prefix is reused within a second and rebuilt after it"""
+        module = request.getfixturevalue(handler)
+        formatted = []
+        strftime = module.time.strftime
+        monkeypatch.setattr(module.time, 'strftime', lambda fmt, t: formatted.append(t) or strftime(fmt, t))
+        
+        stamps = self.now_iso_at(module, monkeypatch, self.NOON + 0.1, self.NOON + 0.2, self.NOON + 1.3)
+        
+        assert stamps == [
+            '2024-01-01T12:00:00.100Z',
+            '2024-01-01T12:00:00.200Z',
+            '2024-01-01T12:00:01.300Z'
+        ]
+        assert len(formatted) == 2
+
+
+class TestSimulateLoad:
+    """Test the SIMULATE_LOAD opt-in in the worker"""
+    
+    @pytest.mark.parametrize('value, enabled', [
+        ('1', True),
+        ('true', True),
+        ('YES', True),
+        ('0', False),
+        ('false', False),
+        ('', False),
+    ])
+    def test_simulate_load_parsed(self, monkeypatch, value, enabled):
+        """Test only explicit truthy values turn the simulated delay on"""
+        module = load_handler('worker', monkeypatch, DYNAMODB_TABLE_NAME='logs', SIMULATE_LOAD=value)
+        sleeps = []
+        monkeypatch.setattr(module.time, 'sleep', sleeps.append)
+        
+        module.simulate_heavy_processing('x' * 10)
+        
+        assert module.SIMULATE_LOAD is enabled
+        assert sleeps == ([0.01] if enabled else [])
+
+
+class TestLogLevel:
+    """Test LOG_LEVEL parsing in both handlers"""
+    
+    @pytest.mark.parametrize('package, env', [
+        ('api', {'SQS_QUEUE_URL': 'https://sqs.example/queue'}),
+        ('worker', {'DYNAMODB_TABLE_NAME': 'logs'}),
+    ])
+    @pytest.mark.parametrize('value, expected', [
+        ('warning', logging.WARNING),
+        ('DEBUG', logging.DEBUG),
+        ('verbose', logging.INFO),
+    ])
+    def test_log_level_parsed(self, monkeypatch, package, env, value, expected):
+        """Test lowercase levels are accepted and invalid ones fall back to INFO"""
+        # The handlers configure the root logger; restore its level afterwards
+        monkeypatch.setattr(logging.getLogger(), 'level', logging.getLogger().level)
+        module = load_handler(package, monkeypatch, LOG_LEVEL=value, **env)
+        
+        assert module.logger.level == expected
+        assert module._LOG_INFO == (expected <= logging.INFO)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
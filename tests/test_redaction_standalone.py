@@ -5,22 +5,24 @@ No dependencies required - pure Python
 """
 import re
 
+# Order matters - longer patterns are listed first so they win at the same position
+PHONE_PATTERNS = [
+    r'\(\d{3}\)[ \t\n\r\f\v]?\d{3}[-.]?\d{4}',  # (555) 555-1234
+    r'\b\d{3}[-. \t\n\r\f\v]\d{3}[-. \t\n\r\f\v]\d{4}\b',  # 555-555-1234
+    r'\b\d{3}[-.]?\d{4}\b',  # 555-0199
+]
+PHONE_RE = re.compile('(?:' + '|'.join(PHONE_PATTERNS) + ')', re.ASCII)
+# Every phone pattern contains a run of four digits; text without one skips the full scan
+_HAS_DIGITS = re.compile(r'\d{4}', re.ASCII)
+
+
 def redact_phone_numbers(text: str) -> str:
     """
     Redact phone numbers from text
     """
-    # Order matters - match longer patterns first
-    patterns = [
-        r'\(\d{3}\)\s?\d{3}[-.]?\d{4}',  # (555) 555-1234
-        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b',  # 555-555-1234
-        r'\b\d{3}[-.]?\d{4}\b',  # 555-0199
-    ]
-    
-    redacted = text
-    for pattern in patterns:
-        redacted = re.sub(pattern, '[REDACTED]', redacted)
-    
-    return redacted
+    if not _HAS_DIGITS.search(text):
+        return text
+    return PHONE_RE.sub('[REDACTED]', text)
 
 # Test cases
 test_cases = [